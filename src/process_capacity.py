@@ -1,8 +1,12 @@
 import os
+import pickle
+import hashlib
 from common import (
-    pd, np, plt, Path, logging, BetaAnalyticsDataClient, DateRange, Dimension, Metric, RunReportRequest, load_dotenv, create_output_dir, setup_logging, AnalyticsDataProcessor
+    pd, np, plt, Path, logging, BetaAnalyticsDataClient, DateRange, Dimension, Metric, RunReportRequest, load_dotenv, create_output_dir, setup_logging, AnalyticsDataProcessor, get_analytics_client, downcast_ga4_metrics, get_or_fetch,
+    MetricSpecification, ProcessCapabilityMetrics
 )
-from typing import Optional, Dict, NamedTuple
+from types import MappingProxyType
+from typing import Optional, Dict
 
 # Load environment variables and setup
 load_dotenv()
@@ -10,26 +14,11 @@ load_dotenv()
 OUTPUT_DIR = create_output_dir("process_capacity_report")
 logger = setup_logging(OUTPUT_DIR, 'process_capacity.log')
 
-class MetricSpecification(NamedTuple):
-    """Specification limits and target for a metric"""
-    usl: float  # Upper Specification Limit
-    lsl: float  # Lower Specification Limit
-    target: float  # Target Value
-
-class ProcessCapabilityMetrics(NamedTuple):
-    """Process capability metrics with additional context"""
-    cp: float
-    cpk: float
-    cpm: float
-    mean: float
-    std: float
-    target: float
-    usl: float
-    lsl: float
-
 class ProcessCapacityAnalyzer:
-    # Define specification limits for each metric
-    METRIC_SPECIFICATIONS = {
+    # Specification limits for each metric. The NamedTuple types live in
+    # common so every module shares one class object, and the mapping is a
+    # read-only proxy safe to share across threads
+    METRIC_SPECIFICATIONS = MappingProxyType({
         'totalUsers': MetricSpecification(
             usl=1000,  # max expected users
             lsl=100,   # min acceptable users
@@ -70,10 +59,26 @@ class ProcessCapacityAnalyzer:
             lsl=30,    # 30 seconds minimum
             target=180 # 3 minutes target
         )
-    }
+    })
+
+    # Column-oriented views of the specifications, built once: the
+    # vectorized capability math slices these aligned arrays instead of
+    # unpacking one NamedTuple attribute at a time per call
+    SPEC_IDX = {m: i for i, m in enumerate(METRIC_SPECIFICATIONS)}
+    SPEC_USL = np.array([s.usl for s in METRIC_SPECIFICATIONS.values()], dtype=np.float64)
+    SPEC_LSL = np.array([s.lsl for s in METRIC_SPECIFICATIONS.values()], dtype=np.float64)
+    SPEC_TARGET = np.array([s.target for s in METRIC_SPECIFICATIONS.values()], dtype=np.float64)
+
+    # Computed capability results are memoized on disk keyed by a hash of
+    # the input data and specifications, so re-analyzing the same dataset
+    # skips the statistics entirely
+    CACHE_DIR = Path('.cap_cache')
+    # Bump to invalidate entries when the capability math changes
+    CACHE_VERSION = 1
 
     def __init__(self):
-        self.client = BetaAnalyticsDataClient()
+        self.client = get_analytics_client()
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
     def get_analytics_data(self, property_id: str) -> Optional[pd.DataFrame]:
         """
@@ -104,7 +109,9 @@ class ProcessCapacityAnalyzer:
                 date_ranges=[DateRange(start_date="30daysAgo", end_date="today")],
             )
             
-            response = self.client.run_report(request)
+            # Identical reruns are served from the shared disk cache instead
+            # of paying the API round-trip again
+            response = get_or_fetch(self.client, request)
             return self._process_response(response, request)
             
         except Exception as e:
@@ -112,102 +119,118 @@ class ProcessCapacityAnalyzer:
             return None
 
     def _process_response(self, response, request) -> pd.DataFrame:
-        """Process the API response into a DataFrame"""
-        rows = []
-        for row in response.rows:
-            row_dict = {}
-            for i, dimension in enumerate(row.dimension_values):
-                row_dict[request.dimensions[i].name] = dimension.value
-            for i, metric in enumerate(row.metric_values):
-                row_dict[request.metrics[i].name] = float(metric.value)
-            rows.append(row_dict)
-        
-        df = pd.DataFrame(rows)
-        return df
-
-    def calculate_process_capability(
-        self, 
-        data: pd.Series,
-        metric_name: str
-    ) -> Optional[ProcessCapabilityMetrics]:
+        """Process the API response into a DataFrame.
+
+        Builds column-oriented arrays in one pass and hands pandas a dict of
+        columns, avoiding the per-row dict allocations and the row-wise
+        inference path of DataFrame(list_of_dicts).
         """
-        Calculate process capability metrics using specified limits and targets
-        
-        Args:
-            data: Series containing metric values
-            metric_name: Name of the metric being analyzed
-            
-        Returns:
-            ProcessCapabilityMetrics if calculation successful, None otherwise
+        n_rows = len(response.rows)
+        dim_names = [d.name for d in request.dimensions]
+        metric_names = [m.name for m in request.metrics]
+
+        dims = [[None] * n_rows for _ in dim_names]
+        mets = [[None] * n_rows for _ in metric_names]
+        for r, row in enumerate(response.rows):
+            for j, dimension in enumerate(row.dimension_values):
+                dims[j][r] = dimension.value
+            for j, metric in enumerate(row.metric_values):
+                mets[j][r] = metric.value
+
+        # Dimension labels become categoricals (integer codes downstream);
+        # metric strings parse in one vectorized np.asarray call per column
+        # instead of a float() call per cell, then downcast to their known
+        # compact dtypes
+        columns = {name: pd.Categorical(dims[j]) for j, name in enumerate(dim_names)}
+        columns.update({name: np.asarray(mets[j], dtype=np.float64) for j, name in enumerate(metric_names)})
+        return downcast_ga4_metrics(pd.DataFrame(columns))
+
+    def calculate_cp_values(self, data: pd.DataFrame) -> Dict[str, ProcessCapabilityMetrics]:
+        """
+        Calculate process capability metrics for all specified metrics
+
+        All metric columns are reduced in a single vectorized pass: zeros and
+        nulls are masked as NaN, then the per-column mean/std and the
+        Cp/Cpk/Cpm formulas are evaluated columnwise over the whole matrix
+        instead of dispatching a separate calculation per metric.
         """
         try:
-            if len(data) < 2:
-                logger.warning(f"Insufficient data points for {metric_name}")
-                return None
+            metric_names = [m for m in self.METRIC_SPECIFICATIONS if m in data.columns]
+            if not metric_names:
+                return {}
 
-            # Remove zeros and nulls
-            data = data[data.notna() & (data != 0)]
-            
-            if len(data) < 2:
-                logger.warning(f"Insufficient valid data points for {metric_name}")
-                return None
+            arr = data[metric_names].to_numpy(dtype=np.float64, copy=False)
+            # Remove zeros and nulls (masked as NaN so the reductions skip them)
+            arr = np.where(arr == 0, np.nan, arr)
+            valid_counts = (~np.isnan(arr)).sum(axis=0)
 
-            # Get specification limits and target
-            spec = self.METRIC_SPECIFICATIONS.get(metric_name)
-            if not spec:
-                logger.warning(f"No specifications defined for {metric_name}")
-                return None
+            spec_idx = np.array([self.SPEC_IDX[m] for m in metric_names])
+            usl = self.SPEC_USL[spec_idx]
+            lsl = self.SPEC_LSL[spec_idx]
+            target = self.SPEC_TARGET[spec_idx]
 
-            mean = data.mean()
-            std = data.std()
-            
-            if std == 0:
-                logger.warning(f"Zero standard deviation found for {metric_name}")
-                return None
+            digest = hashlib.blake2b()
+            digest.update(f'v{self.CACHE_VERSION}:{",".join(metric_names)}'.encode())
+            for spec_arr in (usl, lsl, target):
+                digest.update(spec_arr.tobytes())
+            digest.update(arr.tobytes())
+            cache_path = self.CACHE_DIR / f'{digest.hexdigest()}.pkl'
+            # A corrupt or truncated entry must not poison the analysis:
+            # warn and fall through to recompute (and overwrite it below)
+            try:
+                if cache_path.exists():
+                    with open(cache_path, 'rb') as f:
+                        cached = pickle.load(f)
+                    logger.info("Returning cached capability metrics")
+                    return cached
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable capability cache entry {cache_path}: {str(e)}")
 
-            # Calculate Cp using specified limits
-            cp = (spec.usl - spec.lsl) / (6 * std)
-            
-            # Calculate Cpu and Cpl
-            cpu = (spec.usl - mean) / (3 * std)
-            cpl = (mean - spec.lsl) / (3 * std)
-            
-            # Calculate Cpk as minimum of Cpu and Cpl
-            cpk = min(cpu, cpl)
-            
-            # Calculate Cpm using specified target
-            cpm = cp / np.sqrt(1 + ((mean - spec.target) / std) ** 2)
-
-            return ProcessCapabilityMetrics(
-                cp=cp,
-                cpk=cpk,
-                cpm=cpm,
-                mean=mean,
-                std=std,
-                target=spec.target,
-                usl=spec.usl,
-                lsl=spec.lsl
-            )
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.nanmean(arr, axis=0)
+                std = np.nanstd(arr, axis=0, ddof=1)
+                cp = (usl - lsl) / (6 * std)
+                cpu = (usl - mean) / (3 * std)
+                cpl = (mean - lsl) / (3 * std)
+                cpk = np.minimum(cpu, cpl)
+                cpm = cp / np.sqrt(1 + ((mean - target) / std) ** 2)
 
         except Exception as e:
-            logger.error(f"Error calculating capability for {metric_name}: {str(e)}")
-            return None
+            logger.error(f"Error calculating capability metrics: {str(e)}")
+            return {}
 
-    def calculate_cp_values(self, data: pd.DataFrame) -> Dict[str, ProcessCapabilityMetrics]:
-        """Calculate process capability metrics for all specified metrics"""
         capability_values = {}
-        
-        for metric_name in self.METRIC_SPECIFICATIONS.keys():
-            if metric_name in data.columns:
-                metrics = self.calculate_process_capability(data[metric_name], metric_name)
-                if metrics:
-                    capability_values[metric_name] = metrics
-                    logger.info(
-                        f"Calculated capability metrics for {metric_name}:\n"
-                        f"  Cp={metrics.cp:.2f}, Cpk={metrics.cpk:.2f}, Cpm={metrics.cpm:.2f}\n"
-                        f"  Mean={metrics.mean:.2f}, Target={metrics.target:.2f}\n"
-                        f"  USL={metrics.usl:.2f}, LSL={metrics.lsl:.2f}"
-                    )
+        for i, metric_name in enumerate(metric_names):
+            if valid_counts[i] < 2:
+                logger.warning(f"Insufficient valid data points for {metric_name}")
+                continue
+            if not std[i] > 0:
+                logger.warning(f"Zero standard deviation found for {metric_name}")
+                continue
+
+            metrics = ProcessCapabilityMetrics(
+                cp=cp[i],
+                cpk=cpk[i],
+                cpm=cpm[i],
+                mean=mean[i],
+                std=std[i],
+                target=target[i],
+                usl=usl[i],
+                lsl=lsl[i]
+            )
+            capability_values[metric_name] = metrics
+            logger.info(
+                f"Calculated capability metrics for {metric_name}:\n"
+                f"  Cp={metrics.cp:.2f}, Cpk={metrics.cpk:.2f}, Cpm={metrics.cpm:.2f}\n"
+                f"  Mean={metrics.mean:.2f}, Target={metrics.target:.2f}\n"
+                f"  USL={metrics.usl:.2f}, LSL={metrics.lsl:.2f}"
+            )
+
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump(capability_values, f)
+        except Exception as e:
+            logger.warning(f"Could not write capability cache entry: {str(e)}")
 
         return capability_values
 
@@ -237,9 +260,15 @@ def plot_cp_values(capability_values: Dict[str, ProcessCapabilityMetrics], outpu
     
     # Plot 2: Pareto Chart
     if 'Cp' in metrics_df.columns:
-        sorted_cp = metrics_df['Cp'].sort_values(ascending=False)
-        cumulative_percentage = (sorted_cp.cumsum() / sorted_cp.sum() * 100)
-        
+        # The Pareto panel handles a handful of metrics; argsort/cumsum on
+        # the raw values skips the pandas sort and index machinery
+        cp_vals = metrics_df['Cp'].to_numpy()
+        order = np.argsort(-cp_vals)
+        sorted_cp = cp_vals[order]
+        sorted_labels = metrics_df.index.to_numpy()[order]
+        cumulative_percentage = np.cumsum(sorted_cp) / sorted_cp.sum() * 100
+
+
         bars = ax2.bar(range(len(sorted_cp)), sorted_cp, color='steelblue')
         ax2.set_title('Pareto Chart of Process Capability', fontsize=12, pad=20)
         ax2.set_xlabel('Metrics', fontsize=10)
@@ -250,17 +279,14 @@ def plot_cp_values(capability_values: Dict[str, ProcessCapabilityMetrics], outpu
                      color='red', marker='o', linewidth=2, label='Cumulative %')
         ax2_twin.set_ylabel('Cumulative Percentage (%)', fontsize=10)
         
-        # Add value labels
-        for idx, bar in enumerate(bars):
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{height:.2f}', ha='center', va='bottom')
+        # Add value labels in one pass
+        ax2.bar_label(bars, fmt='%.2f')
         
         for idx, value in enumerate(cumulative_percentage):
             ax2_twin.text(idx, value, f'{value:.1f}%', ha='center', va='bottom')
         
         ax2.set_xticks(range(len(sorted_cp)))
-        ax2.set_xticklabels(sorted_cp.index, rotation=45, ha='right')
+        ax2.set_xticklabels(sorted_labels, rotation=45, ha='right')
         ax2.grid(True, axis='y', linestyle='--', alpha=0.7)
     
     plt.tight_layout()